@@ -4,17 +4,32 @@ Converts an OWL/RDF file to a simplified JSON format for use in static web appli
 Automatically fetches the latest OWL file from the PanResOntology GitHub repository.
 """
 
+import argparse
 import json
 import rdflib
 from rdflib import URIRef, Literal
-from collections import defaultdict
+from rdflib.parser import create_input_source
+from rdflib.plugins.parsers.ntriples import W3CNTriplesParser
+from rdflib.plugins.parsers.rdfxml import RDFXMLParser
+from rdflib.util import guess_format
+import functools
+import mmap
+import re
+import shutil
+import subprocess
 import sys
 import urllib.request
 import os
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Configuration
 GITHUB_RAW_URL = 'https://raw.githubusercontent.com/genomicepidemiology/PanResOntology/refs/heads/master/ontology/panres_v2.owl'
 OWL_FILE = 'panres_v2.owl'
+NT_FILE = 'panres_v2.nt'
 JSON_OUTPUT = 'panres2.json'
 BASE_IRI = "http://myonto.com/PanResOntology.owl#"
 GENES_FASTA = 'panres2_genes.fa'
@@ -29,94 +44,359 @@ NAMESPACES = {
     "http://www.w3.org/2002/07/owl#": 'owl:',
 }
 
+# Predicates whose (non-literal) objects make up the role-based categories
+CATEGORY_PREDICATES = {
+    'has_resistance_class': 'AntibioticClass',
+    'has_predicted_phenotype': 'Phenotype',
+    'has_mechanism_of_resistance': 'Mechanism',
+    'is_from_database': 'Database',
+}
+
+# rdf:type values that make a subject a PanGene
+PANGENE_TYPES = frozenset({'PanGene', 'AntimicrobialResistanceGene', 'BiocideResistanceGene', 'MetalResistanceGene'})
+
+# Literal predicates whose values are (nearly) unique per subject; all other literals are interned
+UNIQUE_LITERAL_PREDICATES = frozenset({'rdfs:label', 'original_fasta_header', 'card_link'})
+
+# Single alternation over all namespaces, longest first so the most specific one wins
+_NS_RE = re.compile('|'.join(re.escape(ns) for ns in sorted(NAMESPACES, key=len, reverse=True)))
+
 def download_owl_file(url, output_file):
     """
     Download the OWL file from GitHub repository.
     """
     print(f"Downloading OWL file from: {url}")
     try:
-        with urllib.request.urlopen(url) as response:
-            content = response.read()
-            with open(output_file, 'wb') as f:
-                f.write(content)
+        # Copy in 1 MiB chunks so the whole file is never held in memory
+        with urllib.request.urlopen(url) as response, open(output_file, 'wb') as f:
+            shutil.copyfileobj(response, f, length=1 << 20)
         print(f"Successfully downloaded to: {output_file}")
-        print(f"File size: {len(content) / 1024:.2f} KB")
+        print(f"File size: {os.path.getsize(output_file) / 1024:.2f} KB")
         return True
     except Exception as e:
         print(f"Error downloading OWL file: {e}")
         return False
 
+def convert_to_ntriples(owl_file, nt_file):
+    """
+    Serialize the OWL file to canonical N-Triples using rapper (raptor2), if installed.
+    Returns True if nt_file was written.
+    """
+    if shutil.which('rapper') is None:
+        return False
+    print(f"Converting to N-Triples: {nt_file}")
+    with open(nt_file, 'wb') as f:
+        result = subprocess.run(['rapper', '-q', '-i', 'rdfxml', '-o', 'ntriples', owl_file], stdout=f)
+    if result.returncode != 0:
+        print(f"Error converting to N-Triples, using {owl_file} instead")
+        return False
+    return True
+
+@functools.lru_cache(maxsize=None)
 def clean_uri(uri_str):
-    """Convert full URI to shortened form."""
-    for namespace, prefix in NAMESPACES.items():
-        if uri_str.startswith(namespace):
-            fragment = uri_str.split('#')[-1] if '#' in uri_str else uri_str.split('/')[-1]
-            return prefix + fragment if prefix else fragment
-    return uri_str
-
-def parse_fasta(fasta_file):
+    """Convert full URI to shortened form (cached and interned, IDs repeat across triples)."""
+    m = _NS_RE.match(uri_str)
+    if m is None:
+        return sys.intern(uri_str)
+    prefix = NAMESPACES[m.group()]
+    fragment = uri_str.rpartition('#')[2] if '#' in uri_str else uri_str.rpartition('/')[2]
+    return sys.intern(prefix + fragment)
+
+_NT_ESCAPE_RE = re.compile(r'\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))')
+_NT_ECHARS = {'t': '\t', 'b': '\b', 'n': '\n', 'r': '\r', 'f': '\f', '"': '"', "'": "'", '\\': '\\'}
+
+def _nt_unescape_match(m):
+    code = m.group(1) or m.group(2)
+    if code:
+        return chr(int(code, 16))
+    char = _NT_ECHARS.get(m.group(3))
+    if char is None:
+        raise ValueError(f"invalid N-Triples escape: \\{m.group(3)}")
+    return char
+
+def _nt_term(term):
+    """Decode an N-Triples term (without <> or quotes) to str."""
+    if b'\\' not in term:
+        return term.decode('utf-8')
+    return _NT_ESCAPE_RE.sub(_nt_unescape_match, term.decode('utf-8'))
+
+def iter_ntriples(nt_file):
+    """
+    Stream (subject, predicate, object, is_literal) tuples from a canonical N-Triples file.
+    Blank-node subjects/objects are yielded as None. Raises ValueError on non-canonical lines.
+    """
+    with open(nt_file, 'rb') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.rstrip()
+            if not line or line[:1] == b'#':
+                continue
+            parts = line.split(b' ', 2)
+            if len(parts) != 3 or parts[2][-2:] != b' .' or parts[1][:1] != b'<':
+                raise ValueError(f"line {line_no} is not canonical N-Triples")
+            subj, pred, obj = parts
+            obj = obj[:-2]
+
+            if subj[:1] == b'<':
+                subj = _nt_term(subj[1:-1])
+            elif subj[:2] == b'_:':
+                subj = None
+            else:
+                raise ValueError(f"line {line_no} has an invalid subject")
+            pred = _nt_term(pred[1:-1])
+
+            first = obj[:1]
+            if first == b'<':
+                yield subj, pred, _nt_term(obj[1:-1]), False
+            elif first == b'"':
+                # Drop the closing quote and any ^^<datatype> or @lang suffix
+                yield subj, pred, _nt_term(obj[1:obj.rindex(b'"')]), True
+            elif obj[:2] == b'_:':
+                yield subj, pred, None, False
+            else:
+                raise ValueError(f"line {line_no} has an invalid object")
+
+class DirectSink:
+    """
+    Groups triples by subject as they arrive, so no rdflib Graph/store is built.
+    Like a Graph, it keeps a triple stated more than once only once.
+    Implements the rdflib N-Triples sink (triple) and the graph methods the RDF/XML parser uses (add, bind).
+    """
+
+    def __init__(self):
+        self.subject_props = {}
+        self.total_triples = 0
+        # Objects seen for each of CATEGORY_PREDICATES, collected while ingesting
+        self.category_objects = {pred: set() for pred in CATEGORY_PREDICATES}
+
+    def ingest(self, subj, pred, obj, is_literal):
+        """Store one triple of full URIs/literal values; blank nodes are passed as None."""
+        if subj is None or obj is None:
+            self.total_triples += 1
+            return  # Skip blank nodes
+
+        subj_id = clean_uri(subj)
+        pred_id = clean_uri(pred)
+
+        if pred_id == 'rdf:type':
+            # Types are stored as plain IDs; they become the subject's 'types' list
+            obj_data = obj if is_literal else clean_uri(obj)
+        elif is_literal:
+            # Repeated literals (lengths, accessions, flags) share the pool clean_uri interns IDs into
+            if pred_id not in UNIQUE_LITERAL_PREDICATES:
+                obj = sys.intern(obj)
+            obj_data = (obj, True)
+        else:
+            obj_id = clean_uri(obj)
+            obj_data = (obj_id, False)
+            members = self.category_objects.get(pred_id)
+            if members is not None:
+                members.add(obj_id)
+
+        # Store property as a (value, is_literal) tuple, or a plain ID for rdf:type
+        subject_props = self.subject_props
+        entry = subject_props.get(subj_id)
+        if entry is None:
+            entry = subject_props[subj_id] = {'properties': {}}
+        properties = entry['properties']
+        plist = properties.get(pred_id)
+        if plist is None:
+            plist = properties[pred_id] = []
+        elif obj_data in plist:
+            return  # Duplicate triple; an rdflib Graph would have stored it once
+        plist.append(obj_data)
+        self.total_triples += 1
+
+    def triple(self, s, p, o):
+        # Exact type checks are much cheaper than isinstance; subclasses fall through to it
+        subj = str(s) if type(s) is URIRef or isinstance(s, URIRef) else None
+        to = type(o)
+        if to is URIRef:
+            self.ingest(subj, str(p), str(o), False)
+        elif to is Literal or isinstance(o, Literal):
+            self.ingest(subj, str(p), str(o), True)
+        elif isinstance(o, URIRef):
+            self.ingest(subj, str(p), str(o), False)
+        else:
+            self.ingest(subj, str(p), None, False)
+
+    def add(self, triple):
+        self.triple(*triple)
+
+    def bind(self, prefix, namespace, override=True, replace=False):
+        pass  # URIs are shortened with NAMESPACES instead
+
+def collect_ntriples(nt_file):
+    """
+    Group a canonical N-Triples file by subject using the fast splitter.
+    """
+    print("Processing triples...")
+    sink = DirectSink()
+    ingest = sink.ingest  # bound once; this loop runs per triple
+    for subj, pred, obj, is_literal in iter_ntriples(nt_file):
+        ingest(subj, pred, obj, is_literal)
+    return sink
+
+def collect_rdflib(owl_file):
+    """
+    Parse an RDF/XML or N-Triples file with rdflib, streaming triples into a DirectSink.
+    Other formats still go through an rdflib Graph, as their parsers need a real store.
+    """
+    sink = DirectSink()
+    rdf_format = guess_format(owl_file) or 'xml'
+
+    try:
+        if rdf_format == 'nt':
+            with open(owl_file, 'rb') as f:
+                W3CNTriplesParser(sink=sink).parse(f)
+        elif rdf_format == 'xml':
+            RDFXMLParser().parse(create_input_source(source=owl_file), sink)
+        else:
+            graph = rdflib.Graph()
+            graph.parse(owl_file, format=rdf_format)
+            for triple in graph:
+                sink.triple(*triple)
+        print(f"Successfully parsed {sink.total_triples} triples")
+    except Exception as e:
+        print(f"Error parsing OWL file: {e}")
+        sys.exit(1)
+
+    return sink
+
+def to_json_properties(properties):
+    """Expand stored property values into the {'value', 'is_literal'} dicts of the JSON output."""
+    json_properties = {}
+    for pred, values in properties.items():
+        if pred == 'rdf:type':
+            json_properties[pred] = [{'value': value, 'is_literal': False} for value in values]
+        else:
+            json_properties[pred] = [{'value': value, 'is_literal': is_literal} for value, is_literal in values]
+    return json_properties
+
+def _dumps(obj, pretty=False):
+    """Serialize obj to UTF-8 JSON bytes, with orjson if available."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def write_json(data, json_file, pretty=False):
+    """
+    Write data to json_file, expanding property value tuples on the way.
+    Subjects are serialized one at a time and removed from data['subjects'] once written,
+    so the object tree and the serialized output are never both held in full.
+    """
+    subjects = data['subjects']
+
+    if pretty:
+        # Human-readable output is for inspection only, so serialize it in one go
+        for entry in subjects.values():
+            entry['properties'] = to_json_properties(entry['properties'])
+        with open(json_file, 'wb') as f:
+            f.write(_dumps(data, pretty=True))
+        return
+
+    with open(json_file, 'wb') as f:
+        f.write(b'{"subjects":{')
+        first = True
+        for subj_id in list(subjects):
+            entry = subjects.pop(subj_id)
+            entry['properties'] = to_json_properties(entry['properties'])
+            if not first:
+                f.write(b',')
+            first = False
+            f.write(_dumps(subj_id))
+            f.write(b':')
+            f.write(_dumps(entry))
+        f.write(b'},"categories":')
+        f.write(_dumps(data['categories']))
+        f.write(b',"metadata":')
+        f.write(_dumps(data['metadata']))
+        f.write(b'}')
+
+def parse_fasta(fasta_file, wanted_ids=None):
     """
     Parse a FASTA file and return a dictionary mapping sequence IDs to sequences.
+    If wanted_ids is given, only sequences whose ID is in it are kept.
     """
     sequences = {}
+    skipped = 0
     if not os.path.exists(fasta_file):
         print(f"Warning: FASTA file not found: {fasta_file}")
         return sequences
 
     print(f"Parsing FASTA file: {fasta_file}")
-    current_id = None
-    current_seq = []
-
-    with open(fasta_file, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if line.startswith('>'):
-                # Save previous sequence
-                if current_id:
-                    sequences[current_id] = ''.join(current_seq)
-                # Start new sequence
-                # Extract ID from header (e.g., >pan_1 -> pan_1, >Pan_1_v1.0.1_identical -> Pan_1)
-                header = line[1:].split()[0]  # Remove '>' and take first part
-                # Remove version suffixes like _v1.0.1_identical
-                if '_v' in header and '_identical' in header:
-                    current_id = header.split('_v')[0]
-                else:
-                    current_id = header
-                current_seq = []
-            else:
-                current_seq.append(line)
+    if os.path.getsize(fasta_file) == 0:
+        print(f"  Parsed {len(sequences)} sequences")
+        return sequences
 
-        # Save last sequence
-        if current_id:
-            sequences[current_id] = ''.join(current_seq)
+    with open(fasta_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # Records start after a '>' at the beginning of a line; find() scans in C
+        if mm[:1] == b'>':
+            pos = 1
+        else:
+            pos = mm.find(b'\n>')
+            pos = pos + 2 if pos != -1 else -1
+
+        while pos != -1:
+            end = mm.find(b'\n>', pos)
+            record = mm[pos:end] if end != -1 else mm[pos:]
+            pos = end + 2 if end != -1 else -1
+
+            nl = record.find(b'\n')
+            header = record[:nl] if nl != -1 else record
+            body = record[nl + 1:] if nl != -1 else b''
+
+            # Extract ID from header (e.g., >pan_1 -> pan_1, >Pan_1_v1.0.1_identical -> Pan_1)
+            header = header.split(None, 1)[0]  # Take first part
+            # Remove version suffixes like _v1.0.1_identical
+            if b'_identical' in header and b'_v' in header:
+                header = header.split(b'_v', 1)[0]
+            seq_id = header.decode()
+            if wanted_ids is not None and seq_id not in wanted_ids:
+                skipped += 1
+                continue
+            sequences[seq_id] = body.translate(None, b' \t\r\n').decode()
 
     print(f"  Parsed {len(sequences)} sequences")
+    if skipped:
+        print(f"  Skipped {skipped} sequences not referenced in the ontology")
     return sequences
 
-def convert_owl_to_json(owl_file, json_file):
+def convert_owl_to_json(owl_file, json_file, pretty=False):
     """
     Parse OWL file and create a JSON structure with:
     - subjects: dictionary of all subjects with their properties
     - categories: pre-categorized lists for quick access
+    Output is compact unless pretty=True.
     """
     print(f"Loading OWL file: {owl_file}")
-    graph = rdflib.Graph()
+    sink = None
 
-    try:
-        graph.parse(owl_file)
-        print(f"Successfully parsed {len(graph)} triples")
-    except Exception as e:
-        print(f"Error parsing OWL file: {e}")
-        sys.exit(1)
+    # Canonical N-Triples can be split directly, without rdflib term objects
+    if owl_file.endswith('.nt'):
+        try:
+            sink = collect_ntriples(owl_file)
+            print(f"Successfully parsed {sink.total_triples} triples")
+        except ValueError as e:
+            print(f"Falling back to rdflib: {e}")
+            sink = None
+
+    if sink is None:
+        sink = collect_rdflib(owl_file)
+
+    subject_props = sink.subject_props
+    total_triples = sink.total_triples
 
     # Parse FASTA files
     print("\nParsing sequence files...")
-    gene_sequences = parse_fasta(GENES_FASTA)
-    protein_sequences = parse_fasta(PROTEINS_FASTA)
+    # Only sequences for subjects in the ontology end up in the JSON
+    gene_sequences = parse_fasta(GENES_FASTA, subject_props)
+    protein_sequences = parse_fasta(PROTEINS_FASTA, subject_props)
 
     # Data structure
     data = {
-        'subjects': {},
+        'subjects': subject_props,
         'categories': {
             'PanGene': [],
             'OriginalGene': [],
@@ -126,77 +406,15 @@ def convert_owl_to_json(owl_file, json_file):
             'Database': []
         },
         'metadata': {
-            'total_triples': len(graph),
+            'total_triples': total_triples,
             'total_subjects': 0
         }
     }
 
-    # First pass: collect all subjects and their properties
-    print("Processing triples...")
-    subject_props = defaultdict(lambda: {'types': [], 'properties': defaultdict(list)})
-
-    for subj, pred, obj in graph:
-        if not isinstance(subj, URIRef):
-            continue  # Skip blank nodes
-
-        subj_id = clean_uri(str(subj))
-        pred_id = clean_uri(str(pred))
-
-        if isinstance(obj, Literal):
-            obj_value = str(obj)
-            obj_data = {'value': obj_value, 'is_literal': True}
-        elif isinstance(obj, URIRef):
-            obj_id = clean_uri(str(obj))
-            obj_data = {'value': obj_id, 'is_literal': False}
-        else:
-            continue  # Skip blank nodes
-
-        # Store property
-        subject_props[subj_id]['properties'][pred_id].append(obj_data)
-
-        # Track types separately
-        if pred_id == 'rdf:type':
-            subject_props[subj_id]['types'].append(obj_data['value'])
-
     print(f"Found {len(subject_props)} subjects")
 
-    # Second pass: build categorized structure (OPTIMIZED)
-    print("Categorizing subjects...")
-
-    # Track which subjects are used as objects for categorization
-    class_subjects = set()
-    phenotype_subjects = set()
-    mechanism_subjects = set()
-    database_subjects = set()
-
-    # Single pass through all subjects to collect relationships
-    print(" -> Scanning for category relationships...")
-    for subj_id, props in subject_props.items():
-        if 'has_resistance_class' in props['properties']:
-            for val in props['properties']['has_resistance_class']:
-                if not val['is_literal']:
-                    class_subjects.add(val['value'])
-
-        if 'has_predicted_phenotype' in props['properties']:
-            for val in props['properties']['has_predicted_phenotype']:
-                if not val['is_literal']:
-                    phenotype_subjects.add(val['value'])
-
-        if 'has_mechanism_of_resistance' in props['properties']:
-            for val in props['properties']['has_mechanism_of_resistance']:
-                if not val['is_literal']:
-                    mechanism_subjects.add(val['value'])
-
-        if 'is_from_database' in props['properties']:
-            for val in props['properties']['is_from_database']:
-                if not val['is_literal']:
-                    database_subjects.add(val['value'])
-
-    print(f" -> Found {len(class_subjects)} classes, {len(phenotype_subjects)} phenotypes, "
-          f"{len(mechanism_subjects)} mechanisms, {len(database_subjects)} databases")
-
-    # Build final subject entries
-    print(" -> Building subject entries...")
+    # Build subject entries and type-based categories (category objects were collected while ingesting)
+    print("Building subject entries...")
     total = len(subject_props)
     count = 0
     for subj_id, props in subject_props.items():
@@ -207,53 +425,39 @@ def convert_owl_to_json(owl_file, json_file):
         # Get label
         label = subj_id
         if 'rdfs:label' in props['properties'] and props['properties']['rdfs:label']:
-            label = props['properties']['rdfs:label'][0]['value']
-
-        # Build subject entry
-        subject_entry = {
-            'id': subj_id,
-            'label': label,
-            'types': props['types'],
-            'properties': {}
-        }
+            label = props['properties']['rdfs:label'][0][0]
 
-        # Convert properties to simple format
-        for pred, values in props['properties'].items():
-            subject_entry['properties'][pred] = values
+        types = props['properties'].get('rdf:type', [])
+
+        # Turn the collected entry into the subject entry in place (subject_props is data['subjects'])
+        props['id'] = subj_id
+        props['label'] = label
+        props['types'] = types
 
         # Add sequences if this is a gene or protein
         # Genes start with lowercase 'pan_', proteins start with uppercase 'Pan_'
         if subj_id in gene_sequences:
-            subject_entry['gene_sequence'] = gene_sequences[subj_id]
+            props['gene_sequence'] = gene_sequences[subj_id]
         if subj_id in protein_sequences:
-            subject_entry['protein_sequence'] = protein_sequences[subj_id]
-
-        data['subjects'][subj_id] = subject_entry
+            props['protein_sequence'] = protein_sequences[subj_id]
 
-        # Categorize
-        types = set(props['types'])
-
-        # PanGene types
-        pangene_types = {'PanGene', 'AntimicrobialResistanceGene', 'BiocideResistanceGene', 'MetalResistanceGene'}
-        if types & pangene_types:
+        # Categorize (types is a short list, so plain membership tests are enough)
+        if any(t in PANGENE_TYPES for t in types):
             data['categories']['PanGene'].append(subj_id)
 
         # OriginalGene
         if 'OriginalGene' in types:
             data['categories']['OriginalGene'].append(subj_id)
 
-        # Role-based categories
-        if subj_id in class_subjects:
-            data['categories']['AntibioticClass'].append(subj_id)
-
-        if subj_id in phenotype_subjects:
-            data['categories']['Phenotype'].append(subj_id)
+    category_objects = sink.category_objects
+    print(f" -> Found {len(category_objects['has_resistance_class'])} classes, "
+          f"{len(category_objects['has_predicted_phenotype'])} phenotypes, "
+          f"{len(category_objects['has_mechanism_of_resistance'])} mechanisms, "
+          f"{len(category_objects['is_from_database'])} databases")
 
-        if subj_id in mechanism_subjects:
-            data['categories']['Mechanism'].append(subj_id)
-
-        if subj_id in database_subjects:
-            data['categories']['Database'].append(subj_id)
+    # Role-based categories (only objects that are also subjects), sorted for stable output
+    for pred, category in CATEGORY_PREDICATES.items():
+        data['categories'][category] = sorted(m for m in category_objects[pred] if m in data['subjects'])
 
     data['metadata']['total_subjects'] = len(data['subjects'])
 
@@ -269,19 +473,23 @@ def convert_owl_to_json(owl_file, json_file):
 
     # Write JSON
     print(f"\nWriting JSON to: {json_file}")
-    with open(json_file, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    write_json(data, json_file, pretty)
 
     print(f"Done! JSON file created: {json_file}")
-    print(f"File size: {len(json.dumps(data)) / 1024 / 1024:.2f} MB")
+    print(f"File size: {os.path.getsize(json_file) / 1024 / 1024:.2f} MB")
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pretty', action='store_true', help='indent the JSON output for human inspection')
+    args = parser.parse_args()
+
     # Download the latest OWL file from GitHub
     print("=== PanRes OWL to JSON Converter ===\n")
 
     if download_owl_file(GITHUB_RAW_URL, OWL_FILE):
         print()
-        convert_owl_to_json(OWL_FILE, JSON_OUTPUT)
+        source_file = NT_FILE if convert_to_ntriples(OWL_FILE, NT_FILE) else OWL_FILE
+        convert_owl_to_json(source_file, JSON_OUTPUT, pretty=args.pretty)
     else:
         print("\nFailed to download OWL file. Exiting.")
         sys.exit(1)